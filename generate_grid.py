@@ -1,20 +1,37 @@
 #!/usr/bin/env python3
 """Generate 6x8 grid with 9 threads per unit (5x5 each)"""
 
+import argparse
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+
+try:  # numba is optional; the NumPy gather below is the fallback
+    from numba import njit
+except ImportError:  # pragma: no cover - depends on the environment
+    njit = None
+
 # Base pattern: 9 threads from upper left corner
 # [0,1] to [1,0], [0,2] to [2,0], [0,3] to [3,0], [0,4] to [4,0], [0,5] to [5,0]
 # [1,5] to [5,1], [2,5] to [5,2], [3,5] to [5,3], [4,5] to [5,4]
-base_paths = [
-    {"start": [0, 1], "end": [1, 0]},
-    {"start": [0, 2], "end": [2, 0]},
-    {"start": [0, 3], "end": [3, 0]},
-    {"start": [0, 4], "end": [4, 0]},
-    {"start": [0, 5], "end": [5, 0]},
-    {"start": [1, 5], "end": [5, 1]},
-    {"start": [2, 5], "end": [5, 2]},
-    {"start": [3, 5], "end": [5, 3]},
-    {"start": [4, 5], "end": [5, 4]},
-]
+# Shape (9, 2, 2): path, start/end, x/y.
+BASE = np.array(
+    [
+        [[0, 1], [1, 0]],
+        [[0, 2], [2, 0]],
+        [[0, 3], [3, 0]],
+        [[0, 4], [4, 0]],
+        [[0, 5], [5, 0]],
+        [[1, 5], [5, 1]],
+        [[2, 5], [5, 2]],
+        [[3, 5], [5, 3]],
+        [[4, 5], [5, 4]],
+    ],
+    dtype=np.int64,
+)
 
 
 def transform_path(path, row_parity, col_parity, unit_size=5):
@@ -24,137 +41,252 @@ def transform_path(path, row_parity, col_parity, unit_size=5):
 
     if row_parity == 0 and col_parity == 0:
         # (0, 0): upper left to lower right - use as is
-        return {"start": [x, y], "end": [x_end, y_end]}
+        return {"start": (x, y), "end": (x_end, y_end)}
     elif row_parity == 0 and col_parity == 1:
         # (0, 1): upper right to lower left - mirror horizontally
-        return {"start": [unit_size - x, y], "end": [unit_size - x_end, y_end]}
+        return {"start": (unit_size - x, y), "end": (unit_size - x_end, y_end)}
     elif row_parity == 1 and col_parity == 0:
         # (1, 0): lower left to upper right - mirror both axes
-        return {"start": [x, unit_size - y], "end": [x_end, unit_size - y_end]}
+        return {"start": (x, unit_size - y), "end": (x_end, unit_size - y_end)}
     else:  # row_parity == 1 and col_parity == 1
         # (1, 1): upper left to lower right - use as is
-        return {"start": [x, y], "end": [x_end, y_end]}
-
-
-# Generate 6x8 grid (6 columns, 8 rows)
-threads = []
-for row in range(8):  # rows 0-7
-    for col in range(6):  # columns 0-5
-        x_offset = col * 5
-        y_offset = row * 5
-        # Checkerboard pattern: red if (row + col) is even, blue otherwise
-        color = "red" if (row + col) % 2 == 0 else "blue"
-
-        row_parity = row % 2
-        col_parity = col % 2
-
-        # Transform base paths and apply translation
-        unit_paths = []
-        for base_path in base_paths:
-            transformed = transform_path(base_path, row_parity, col_parity)
-            unit_paths.append(
+        return {"start": (x, y), "end": (x_end, y_end)}
+
+
+UNIT_SIZE = 5
+
+# Position labels for the emitted unit comments, precomputed once
+# instead of rebuilding dicts and cascading ternaries inside the
+# emission loop. COL_DESC is 1-indexed via [col - 1]; ROW_NTH is indexed
+# by the 1-based row for the interior rows 2-7.
+COL_DESC = (b"left", b"col-2", b"middle", b"middle", b"col-5", b"right")
+ROW_NTH = (None, None, b"second", b"third", b"fourth", b"fifth", b"sixth", b"seventh")
+
+OUTPUT_FILE = "threebyfour.yaml"
+
+
+def _fill_coords(base, out, unit_size):
+    """Fill ``out`` (rows, cols, paths, 4) with transformed coordinates.
+
+    Explicit scalar loops with the parity cases of transform_path
+    inlined as straight-line arithmetic; under numba this compiles to a
+    few ops per path and scales to large grids where the per-cell
+    Python/NumPy overhead would dominate.
+    """
+    rows = out.shape[0]
+    cols = out.shape[1]
+    n_paths = out.shape[2]
+    for row in range(rows):
+        rp = row & 1
+        y_off = row * unit_size
+        for col in range(cols):
+            cp = col & 1
+            x_off = col * unit_size
+            for k in range(n_paths):
+                sx = base[k, 0, 0]
+                sy = base[k, 0, 1]
+                ex = base[k, 1, 0]
+                ey = base[k, 1, 1]
+                if rp == 0 and cp == 1:
+                    # Upper right to lower left - mirror horizontally
+                    sx = unit_size - sx
+                    ex = unit_size - ex
+                elif rp == 1 and cp == 0:
+                    # Lower left to upper right - mirror both axes
+                    sy = unit_size - sy
+                    ey = unit_size - ey
+                # (0, 0) and (1, 1): use as is
+                out[row, col, k, 0] = sx + x_off
+                out[row, col, k, 1] = sy + y_off
+                out[row, col, k, 2] = ex + x_off
+                out[row, col, k, 3] = ey + y_off
+
+
+if njit is not None:
+    _fill_coords = njit(cache=True, boundscheck=False)(_fill_coords)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_coords(rows, cols, unit_size=UNIT_SIZE):
+    """Build the packed (rows, cols, 9, 4) int16 coordinate array.
+
+    Memoized on the (rows, cols, unit_size) tuple; repeat calls hand
+    back the same array, so callers must treat it as read-only.
+    """
+    if njit is not None:
+        out = np.empty((rows, cols, BASE.shape[0], 4), dtype=np.int16)
+        _fill_coords(BASE.astype(np.int16), out, unit_size)
+        return out
+
+    # Partial evaluation: run transform_path over the base pattern once
+    # per parity combination, so the grid build below is a pure table
+    # lookup plus translation with no parity branches left at runtime.
+    # Shape (2, 2, 9, 2, 2): row parity, col parity, path, start/end, x/y.
+    transformed = np.empty((2, 2, 9, 2, 2), dtype=np.int64)
+    for rp in range(2):
+        for cp in range(2):
+            for k in range(9):
+                t = transform_path(
+                    {"start": BASE[k, 0].tolist(), "end": BASE[k, 1].tolist()},
+                    rp,
+                    cp,
+                    unit_size=unit_size,
+                )
+                transformed[rp, cp, k, 0] = t["start"]
+                transformed[rp, cp, k, 1] = t["end"]
+
+    # Fancy-index the transform table by each cell's parity (one copying
+    # gather) and translate in place.
+    row_idx = np.arange(rows)
+    col_idx = np.arange(cols)
+    grid_coords = transformed[(row_idx % 2)[:, None], (col_idx % 2)[None, :]]
+    grid_coords[..., 0] += (col_idx * unit_size)[None, :, None, None]
+    grid_coords[..., 1] += (row_idx * unit_size)[:, None, None, None]
+
+    # Packed struct-of-arrays form: last axis is [sx, sy, ex, ey].
+    # int16 keeps the array small while staying exact out to grids of
+    # thousands of rows/cols; int8 would silently wrap past coordinate
+    # 127 (~25 rows at unit_size 5).
+    return grid_coords.reshape(rows, cols, 9, 4).astype(np.int16)
+
+
+def _emit_yaml(coords, unit_size=UNIT_SIZE):
+    """Render the design as commented YAML, returned as UTF-8 bytes.
+
+    The document is assembled straight into one preallocated bytearray
+    via slice assignment at a running offset - a single allocation for
+    the whole output instead of a list of string parts plus a
+    join/encode pass. Lines are formatted with bytes %-formatting,
+    which is C-level and skips the str-to-bytes encode entirely.
+    """
+    n_rows, n_cols = coords.shape[:2]
+
+    # ~440 bytes per unit in practice; lean high, the final slice trims
+    # to the bytes actually written (and bytearray slice assignment
+    # grows the buffer anyway if the estimate is ever short).
+    buf = bytearray(80 + n_rows * n_cols * (32 + 560))
+    off = 0
+
+    def put(line):
+        nonlocal off
+        end = off + len(line)
+        buf[off:end] = line
+        off = end
+
+    put(b"# Color definitions - modify colors here to change all units\n")
+    put(b"colors:\n")
+
+    # Generate color anchors for all units; correct YAML anchor syntax
+    # is key: &anchor value.
+    for row in range(n_rows):
+        for col in range(n_cols):
+            color = b"red" if (row + col) % 2 == 0 else b"blue"
+            put(b"  color%d%d: &color%d%d %b\n" % (row + 1, col + 1, row + 1, col + 1, color))
+
+    put(b"\nthreads:\n")
+    # One pass straight over the grid; no flat index to divmod back
+    # into coordinates.
+    for actual_row in range(n_rows):
+        row = actual_row + 1  # 1-indexed for display
+        for actual_col in range(n_cols):
+            col = actual_col + 1  # 1-indexed for display
+
+            # Format comment similar to existing file; the lookup tables
+            # cover the stock 6x8 grid, with generic labels past them.
+            col_desc = COL_DESC[col - 1] if col <= len(COL_DESC) else b"col-%d" % col
+            if row == 1:
+                put(b"  # Unit %d,%d (top-%b)\n" % (col, row, col_desc))
+            elif row == n_rows:
+                put(b"  # Unit %d,%d (bottom-%b)\n" % (col, row, col_desc))
+            else:
+                row_desc = ROW_NTH[row] if row < len(ROW_NTH) else b"%dth" % row
+                put(b"  # Unit %d,%d (%b row, %b)\n" % (col, row, row_desc, col_desc))
+
+            put(b"  - color: *color%d%d\n    paths:\n" % (row, col))
+
+            x_offset = actual_col * unit_size
+            y_offset = actual_row * unit_size
+
+            # Translation comment if needed
+            if x_offset > 0 or y_offset > 0:
+                trans_parts = []
+                if x_offset > 0:
+                    trans_parts.append(b"+%d in x" % x_offset)
+                if y_offset > 0:
+                    trans_parts.append(b"+%d in y" % y_offset)
+                put(b"      # Threads (translated %b)\n" % b" and ".join(trans_parts))
+
+            for sx, sy, ex, ey in coords[actual_row, actual_col]:
+                put(b"      - start: [%d, %d]\n        end: [%d, %d]\n" % (sx, sy, ex, ey))
+
+    return memoryview(buf)[:off]
+
+
+def _emit_json(coords):
+    """Render the design as compact JSON bytes.
+
+    Pure data only - no comments, anchors or translation notes, which
+    is where the YAML emitter spends most of its time. Any YAML parser
+    accepts JSON, so downstream consumers keep working.
+    """
+    n_rows, n_cols = coords.shape[:2]
+    threads = []
+    for row in range(n_rows):
+        for col in range(n_cols):
+            threads.append(
                 {
-                    "start": [
-                        transformed["start"][0] + x_offset,
-                        transformed["start"][1] + y_offset,
-                    ],
-                    "end": [
-                        transformed["end"][0] + x_offset,
-                        transformed["end"][1] + y_offset,
+                    "color": "red" if (row + col) % 2 == 0 else "blue",
+                    "paths": [
+                        {"start": [int(sx), int(sy)], "end": [int(ex), int(ey)]}
+                        for sx, sy, ex, ey in coords[row, col]
                     ],
                 }
             )
+    return json.dumps({"threads": threads}, separators=(",", ":")).encode("utf-8")
 
-        threads.append({"color": color, "paths": unit_paths})
-
-# Write YAML file with color anchors
-yaml_content = "# Color definitions - modify colors here to change all units\n"
-yaml_content += "colors:\n"
-
-# Generate color anchors for all units
-for row in range(8):  # rows 1-8
-    for col in range(6):  # columns 1-6
-        row_display = row + 1
-        col_display = col + 1
-        anchor_name = f"color{row_display}{col_display}"
-        # Checkerboard pattern: red if (row + col) is even, blue otherwise
-        color_value = "red" if (row + col) % 2 == 0 else "blue"
-        # Correct YAML anchor syntax: key: &anchor value
-        yaml_content += f"  {anchor_name}: &{anchor_name} {color_value}\n"
-
-yaml_content += "\nthreads:\n"
-for i, thread in enumerate(threads):
-    row = i // 6 + 1  # 1-indexed for display
-    col = i % 6 + 1  # 1-indexed for display
-    actual_row = i // 6  # 0-indexed for logic
-    actual_col = i % 6  # 0-indexed for logic
-
-    # Format comment similar to existing file
-    if row == 1:
-        col_desc = (
-            "left"
-            if col == 1
-            else (
-                "middle"
-                if col == 3 or col == 4
-                else "right" if col == 6 else f"col-{col}"
-            )
-        )
-        comment = f"  # Unit {col},{row} (top-{col_desc})\n"
-    elif row == 8:
-        col_desc = (
-            "left"
-            if col == 1
-            else (
-                "middle"
-                if col == 3 or col == 4
-                else "right" if col == 6 else f"col-{col}"
-            )
-        )
-        comment = f"  # Unit {col},{row} (bottom-{col_desc})\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the 6x8 grid design")
+    parser.add_argument(
+        "--format",
+        choices=("yaml", "json"),
+        default="yaml",
+        help="output format: yaml keeps the commented, anchored layout "
+        "for human inspection, json is compact data only (default: yaml)",
+    )
+    args = parser.parse_args()
+
+    coords = _build_coords(8, 6)
+    if args.format == "json":
+        out_file = os.path.splitext(OUTPUT_FILE)[0] + ".json"
+        emitted = _emit_json(coords)
     else:
-        col_desc = (
-            "left"
-            if col == 1
-            else (
-                "middle"
-                if col == 3 or col == 4
-                else "right" if col == 6 else f"col-{col}"
-            )
-        )
-        row_names = {
-            2: "second",
-            3: "third",
-            4: "fourth",
-            5: "fifth",
-            6: "sixth",
-            7: "seventh",
-        }
-        row_desc = row_names.get(row, f"{row}th")
-        comment = f"  # Unit {col},{row} ({row_desc} row, {col_desc})\n"
-
-    yaml_content += comment
-    anchor_name = f"color{row}{col}"
-    yaml_content += f"  - color: *{anchor_name}\n"
-    yaml_content += "    paths:\n"
-
-    x_offset = actual_col * 5
-    y_offset = actual_row * 5
-
-    # Add translation comment if needed
-    if x_offset > 0 or y_offset > 0:
-        trans_parts = []
-        if x_offset > 0:
-            trans_parts.append(f"+{x_offset} in x")
-        if y_offset > 0:
-            trans_parts.append(f"+{y_offset} in y")
-        trans_comment = f" (translated {' and '.join(trans_parts)})"
-        yaml_content += f"      # Threads{trans_comment}\n"
-
-    # Output all 9 paths
-    for path in thread["paths"]:
-        yaml_content += f"      - start: [{path['start'][0]}, {path['start'][1]}]\n"
-        yaml_content += f"        end: [{path['end'][0]}, {path['end'][1]}]\n"
-
-# Output to stdout
-print(yaml_content, end="")
+        out_file = OUTPUT_FILE
+        emitted = _emit_yaml(coords)
+
+    # Skip the write entirely when the output would be byte-identical,
+    # tracked via a hash sidecar so repeat invocations do no I/O beyond
+    # reading back one digest.
+    sha_file = f".{out_file}.sha"
+    sha = hashlib.blake2b(emitted).hexdigest()
+    try:
+        with open(sha_file) as f:
+            unchanged = f.read().strip() == sha and os.path.exists(out_file)
+    except OSError:
+        unchanged = False
+    if unchanged:
+        print(f"{out_file} unchanged")
+        return
+
+    with open(out_file, "wb") as f:
+        f.write(emitted)
+    try:
+        with open(sha_file, "w") as f:
+            f.write(sha + "\n")
+    except OSError:
+        pass
+    print(f"Wrote {out_file}")
+
+
+if __name__ == "__main__":
+    main()